@@ -30,7 +30,9 @@ import argparse
 import logging
 import re
 import os
+import sys
 
+from array import array
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 from typing import List, Tuple, Union, Any
@@ -221,6 +223,11 @@ class AnsiEscape():
         else:
             raise NotImplementedError(f"Cannot interpret arguments for function {str(self.function)}")
 
+    @property
+    def clears_screen(self) -> bool:
+        """Return whether this sequence erases the entire screen."""
+        return self._function == AnsiFunctions.ERASE_IN_DISPLAY.value and self.arguments == AnsiEdCommands.ENTIRE_SCREEN
+
     @classmethod
     def color(cls, color: AnsiColors, bold: bool) -> Tuple[int, int, int]:
         """Return the RGB code for the given color.
@@ -356,6 +363,16 @@ class Terminal():
                 self.col = 0
                 self.skipNextNewline = True
 
+    def write_text(self, text: str) -> None:
+        """Write a run of characters to the terminal.
+        
+        Params:
+            text:
+                The characters to write to the terminal.
+        """
+        for character in text:
+            self.write(character)
+
 
 class ImageTerminal(Terminal):
     """Simulates a terminal whose output can be exported to an image."""
@@ -423,6 +440,14 @@ class ImageTerminal(Terminal):
 class TextTerminal(Terminal):
     """Simulates a terminal whose output can be exported to a text file."""
 
+    # Each tile is stored as an array of code points rather than a list of characters,
+    # so that wide consoles don't cost a Python object per cell
+    TILE_TYPECODE   = "I"
+    TILE_ENCODING   = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+
+    # Characters which are handled by write() rather than by being copied to a tile
+    SPECIAL_CHARACTERS = re.compile("[\n\r♣]")
+
     def __init__(self, width: int) -> None:
         super().__init__(width)
 
@@ -435,11 +460,53 @@ class TextTerminal(Terminal):
 
     def _append_new_tile(self) -> None:
         """Create a new row in the terminal."""
-        self.tiles.append([" "] * self.width)
+        self.tiles.append(array(self.TILE_TYPECODE, [ord(" ")]) * self.width)
 
-    def _write(self, tile: List[str], character: str) -> None:
+    def _write(self, tile: array, character: str) -> None:
         """Write a character to the terminal at the current cursor location."""
-        tile[self.col] = character
+        tile[self.col] = ord(character)
+
+    def write_text(self, text: str) -> None:
+        """Write a run of characters to the terminal.
+
+        Characters up to the end of the current row are copied to the tile at once.
+        
+        Params:
+            text:
+                The characters to write to the terminal.
+        """
+        i = 0
+        while i < len(text):
+            match = self.SPECIAL_CHARACTERS.search(text, i)
+            end = match.start() if match else len(text)
+
+            while i < end:
+                if not (0 <= self.row and 0 <= self.col < self.width):
+                    # Cursor is outside of the screen, let write() handle it
+                    self.write(text[i])
+                    i += 1
+                    continue
+
+                for _ in range(len(self.tiles), self.row + 1):
+                    self._append_new_tile()
+
+                count = min(end - i, self.width - self.col)
+                run = array(self.TILE_TYPECODE)
+                run.frombytes(text[i:i + count].encode(self.TILE_ENCODING))
+                self.tiles[self.row][self.col:self.col + count] = run
+
+                i += count
+                self.col += count
+                self.skipNextNewline = False
+
+                if (self.col == self.width):
+                    self.row += 1
+                    self.col = 0
+                    self.skipNextNewline = True
+
+            if match:
+                self.write(match.group())
+                i += 1
 
     def set_fgcolor(self, color: AnsiColors) -> None:
         """Set foreground color."""
@@ -470,22 +537,67 @@ class TextTerminal(Terminal):
                 with open(path, "w", encoding = "utf8") as o:
                     o.write(self.text)
         
-        content = ""
+        lines = []
 
         LEFT_RIGHT_MARK = u"\u200E"
         RIGHT_LEFT_MARK = u"\u200F"
 
         for tile in self.tiles:
-            line = "".join(tile)
+            line = tile.tobytes().decode(self.TILE_ENCODING)
             line = re.sub(r'O([א-ת]+)', r'ם\1', line)
             #content += LEFT_RIGHT_MARK + self.get_display(line) + LEFT_RIGHT_MARK + "\n"
             line = self.get_display(line)
             if not re.match('[א-ת]+', line):
                 line = LEFT_RIGHT_MARK + line + LEFT_RIGHT_MARK
             line += "\n"
-            content += line
+            lines.append(line)
+
+        return TextWrapper("".join(lines))
+
+
+class StateTerminal(Terminal):
+    """Simulates a terminal which only tracks its state, without producing any output."""
+
+    def _append_new_tile(self) -> None:
+        """Create a new row in the terminal."""
+        self.tiles.append(None)
+
+    def _write(self, tile: None, character: str) -> None:
+        """Write a character to the terminal at the current cursor location."""
+        pass
+
+    def set_fgcolor(self, color: AnsiColors) -> None:
+        """Set foreground color."""
+        self.foreground = color
+    
+    def set_bgcolor(self, color: AnsiColors) -> None:
+        """Set background color."""
+        self.background = color
+    
+    def set_default_colors(self) -> None:
+        """Reset terminal colors."""
+        self.set_fgcolor(AnsiColors.WHITE)
+        self.set_bgcolor(AnsiColors.BLACK)
+        self.bold = False
 
-        return TextWrapper(content)
+    def set_bold(self, bold: bool) -> None:
+        """Set boldness."""
+        self.bold = bold
+
+    def apply_state(self, terminal: Terminal) -> None:
+        """Carry the state that survives clearing the screen over to another terminal.
+        
+        Params:
+            terminal:
+                A terminal whose screen is currently clear.
+        """
+        terminal.set_fgcolor(self.foreground)
+        terminal.set_bgcolor(self.background)
+        terminal.set_bold(self.bold)
+
+        terminal.saved_row = self.saved_row
+        terminal.saved_col = self.saved_col
+        terminal.skipNextNewline = self.skipNextNewline
 
 
 def decode_file(buffer: bytes) -> List[Union[str, AnsiEscape]]:
@@ -536,39 +648,30 @@ def decode_file(buffer: bytes) -> List[Union[str, AnsiEscape]]:
 
     return res
 
-def export_file(buffer: bytes, **kwargs):
-    """Export a given text file as a decoded image/text.
+def render(terminal: Terminal, content: List[Union[str, AnsiEscape]], skip_ansi: bool) -> None:
+    """Render decoded content to a terminal.
 
         Params:
-            buffer:
-                Buffer representing the text file.
-            
-            kwargs:
-                console_width: 
-                    Console Width (in characters). Default is CONSOLE_WIDTH_DEFAULT.
-                skip_ansi:
-                    Whether or not to parse ANSI escape codes. Default is False.
-                format:
-                    Export format: Text or Image. Default is image.
-    """
+            terminal:
+                The terminal to render to.
 
-    console_width = kwargs.get("console_width", Terminal.CONSOLE_WIDTH_DEFAULT)
-    if console_width < Terminal.CONSOLE_WIDTH_MIN or console_width > Terminal.CONSOLE_WIDTH_MAX:
-        raise ValueError(f"Console width {console_width} not in allowed range ({Terminal.CONSOLE_WIDTH_MIN}-{Terminal.CONSOLE_WIDTH_MAX}")
-
-    skip_ansi = kwargs.get("skip_ansi", False)
-
-    format_class = {"image": ImageTerminal, "text": TextTerminal}[kwargs.get("format", "image")]
-
-    terminal = format_class(console_width)
-    content = decode_file(buffer)
+            content:
+                List of characters/AnsiEscape objects, as returned by decode_file().
 
+            skip_ansi:
+                Whether or not to parse ANSI escape codes.
+    """
+    # Consecutive characters are collected and written to the terminal as a single run
+    text = []
     for c in content:
         if not isinstance(c, AnsiEscape):
-            terminal.write(c)
+            text.append(c)
         else:
             if skip_ansi:
                 continue
+            if text:
+                terminal.write_text("".join(text))
+                text = []
             if c.function == AnsiFunctions.CURSOR_FORWARD:
                 terminal.move_right(c.arguments)
             elif c.function == AnsiFunctions.CURSOR_BACK:
@@ -594,7 +697,52 @@ def export_file(buffer: bytes, **kwargs):
                         terminal.set_default_colors()
                     elif command.type == AnsiSgrCommands.SET_BOLD:
                         terminal.set_bold(True)
-    
+    if text:
+        terminal.write_text("".join(text))
+
+def export_file(buffer: bytes, **kwargs):
+    """Export a given text file as a decoded image/text.
+
+        Params:
+            buffer:
+                Buffer representing the text file.
+            
+            kwargs:
+                console_width: 
+                    Console Width (in characters). Default is CONSOLE_WIDTH_DEFAULT.
+                skip_ansi:
+                    Whether or not to parse ANSI escape codes. Default is False.
+                format:
+                    Export format: Text or Image. Default is image.
+                split_screens:
+                    Whether or not to skip rendering screens which are later cleared. Default is False.
+    """
+
+    console_width = kwargs.get("console_width", Terminal.CONSOLE_WIDTH_DEFAULT)
+    if console_width < Terminal.CONSOLE_WIDTH_MIN or console_width > Terminal.CONSOLE_WIDTH_MAX:
+        raise ValueError(f"Console width {console_width} not in allowed range ({Terminal.CONSOLE_WIDTH_MIN}-{Terminal.CONSOLE_WIDTH_MAX}")
+
+    skip_ansi = kwargs.get("skip_ansi", False)
+    split_screens = kwargs.get("split_screens", False)
+
+    format_class = {"image": ImageTerminal, "text": TextTerminal}[kwargs.get("format", "image")]
+
+    terminal = format_class(console_width)
+    content = decode_file(buffer)
+
+    if split_screens and not skip_ansi:
+        # Clearing the screen drops all tiles, so only the last screen ends up in the output.
+        # Everything before it is replayed without drawing, just to carry over the terminal state.
+        last_screen = next((len(content) - i for i, c in enumerate(reversed(content))
+                            if isinstance(c, AnsiEscape) and c.clears_screen), 0)
+        if last_screen > 0:
+            state = StateTerminal(console_width)
+            render(state, content[:last_screen], skip_ansi)
+            state.apply_state(terminal)
+            content = content[last_screen:]
+
+    render(terminal, content, skip_ansi)
+
     return terminal.export()
 
 def main(input_path: str, output_path: str, **kwargs) -> None:
@@ -623,6 +771,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Decode old Hebrew text files encoded with Code Page 862")
     parser.add_argument('-w', '--console-width', type=int, default=Terminal.CONSOLE_WIDTH_DEFAULT, help="Console width")
     parser.add_argument('-s', '--skip_ansi', action='store_true', default=False, help="Skip ANSI Color codes")
+    parser.add_argument('-c', '--split-screens', action='store_true', default=False, help="Only render the screen after the last clear-screen sequence")
     parser.add_argument('-f', '--format', choices = ["image", "text"], default="image", help="Output format")
 
     input_group = parser.add_mutually_exclusive_group(required = True)
@@ -643,6 +792,7 @@ if __name__ == "__main__":
     kwargs["console_width"] = args.console_width
     kwargs["skip_ansi"] = args.skip_ansi
     kwargs["format"] = args.format
+    kwargs["split_screens"] = args.split_screens
 
     default_output_extension = {"image": "png", "text": "txt"}[args.format]
 